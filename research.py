@@ -7,9 +7,18 @@ from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import google.generativeai as genai
 import requests
 import fitz
+import httplib2
 import json
 import typing
 import os
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import date
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from dotenv import load_dotenv
 import typing_extensions as typing
 
@@ -21,6 +30,8 @@ GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
 GOOGLE_GEMINI_API_KEY = os.getenv("GOOGLE_GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 JINA_API_KEY = os.getenv("JINA_API_KEY")
+# Optional: enables Tavily as the hedged secondary search provider
+TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
 # Validate that all required environment variables are set
 required_env_vars = ["GOOGLE_API_KEY", "GOOGLE_CSE_ID", "GOOGLE_GEMINI_API_KEY", "OPENAI_API_KEY", "JINA_API_KEY"]
@@ -28,7 +39,7 @@ missing_vars = [var for var in required_env_vars if not os.getenv(var)]
 if missing_vars:
     raise EnvironmentError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
-google_search = build("customsearch", "v1", developerKey=GOOGLE_API_KEY).cse()
+tavily = TavilyClient(api_key=TAVILY_API_KEY) if TAVILY_API_KEY else None
 
 genai.configure(api_key=GOOGLE_GEMINI_API_KEY)
 model = genai.GenerativeModel('gemini-1.5-pro-latest')
@@ -220,14 +231,200 @@ def generate_keywords(user_input: str, sub_question: str) -> List[str]:
 
     return keyword_generator_response.choices[0].message.parsed.keywords
 
+SEARCH_RESULTS_PER_PROVIDER = 10
+SEARCH_REQUEST_TIMEOUT = 15  # seconds hedged_search waits for any answer; also the Google HTTP timeout
+SEARCH_MERGE_GRACE = 0.5  # seconds to wait for other in-flight providers after the first answer
+SEARCH_STOP_POLL_INTERVAL = 0.5  # seconds between stop event checks while waiting on providers
+# Fire the secondary provider once the primary is slower than this percentile of its recent latencies
+SEARCH_HEDGE_PERCENTILE = 95
+SEARCH_HEDGE_DEFAULT_DELAY = 1.5  # seconds, used until enough latency samples exist
+SEARCH_HEDGE_MIN_SAMPLES = 5
+SEARCH_LATENCY_WINDOW = 50
+TRACKING_QUERY_PARAMS = ("utm_", "gclid", "fbclid")
+
+class SearchUnavailableError(Exception):
+    """Raised when no search provider could answer a query (all failed or out of quota)."""
+
+class SearchProvider(ABC):
+    """A web search backend with per-provider latency and daily quota tracking."""
+
+    def __init__(self, name: str, daily_quota: Optional[int] = None):
+        self.name = name
+        self.daily_quota = daily_quota
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=SEARCH_LATENCY_WINDOW)
+        self._quota_day = date.today()
+        self._calls_today = 0
+
+    @abstractmethod
+    def _search(self, search_term: str) -> List[str]:
+        pass
+
+    def try_acquire(self) -> bool:
+        """Reserve one call against today's quota; returns False if it is exhausted."""
+        with self._lock:
+            if self._quota_day != date.today():
+                self._quota_day = date.today()
+                self._calls_today = 0
+            if self.daily_quota is not None and self._calls_today >= self.daily_quota:
+                return False
+            self._calls_today += 1
+            return True
+
+    def hedge_delay(self) -> float:
+        """Latency percentile after which a hedged request should be sent."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < SEARCH_HEDGE_MIN_SAMPLES:
+            return SEARCH_HEDGE_DEFAULT_DELAY
+        index = min(len(samples) - 1, int(len(samples) * SEARCH_HEDGE_PERCENTILE / 100))
+        return samples[index]
+
+    def search(self, search_term: str) -> List[str]:
+        start = time.monotonic()
+        urls = self._search(search_term)
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+        return urls
+
+class GoogleSearchProvider(SearchProvider):
+    def __init__(self, name: str, daily_quota: Optional[int] = None):
+        super().__init__(name, daily_quota)
+        # httplib2.Http is not thread-safe, so every search thread gets its own resource
+        self._local = threading.local()
+
+    def _resource(self):
+        if not hasattr(self._local, "cse"):
+            http = httplib2.Http(timeout=SEARCH_REQUEST_TIMEOUT)
+            self._local.cse = build("customsearch", "v1", developerKey=GOOGLE_API_KEY, http=http).cse()
+        return self._local.cse
+
+    def _search(self, search_term: str) -> List[str]:
+        google_search_result = self._resource().list(q=search_term, cx=GOOGLE_CSE_ID).execute()
+        return [result["link"] for result in google_search_result.get("items", [])]
+
+class TavilySearchProvider(SearchProvider):
+    def _search(self, search_term: str) -> List[str]:
+        tavily_search_result = tavily.search(query=search_term, max_results=SEARCH_RESULTS_PER_PROVIDER)
+        return [result["url"] for result in tavily_search_result.get("results", [])]
+
+def _quota_from_env(var: str) -> Optional[int]:
+    value = os.getenv(var)
+    if not value:
+        return None
+    if not value.strip().isdigit():
+        raise EnvironmentError(f"Invalid value for {var}: expected a non-negative integer, got {value!r}")
+    return int(value)
+
+search_providers = [GoogleSearchProvider("google", _quota_from_env("GOOGLE_CSE_DAILY_QUOTA"))]
+if tavily:
+    search_providers.append(TavilySearchProvider("tavily", _quota_from_env("TAVILY_DAILY_QUOTA")))
+
+# Shared pool so a slow primary request never blocks the caller once a hedge has answered
+search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a URL so the same page from different providers deduplicates."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_QUERY_PARAMS)
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), host, path, urlencode(sorted(query)), ""))
+
+def merge_search_results(results: List[List[str]]) -> List[str]:
+    """Merge provider result lists in order, keeping the first URL seen per canonical URL."""
+    seen = set()
+    merged = []
+    for urls in results:
+        for url in urls:
+            canonical = canonicalize_url(url)
+            if canonical not in seen:
+                seen.add(canonical)
+                merged.append(url)
+    return merged
+
+def hedged_search(search_term: str, job_id: str) -> List[str]:
+    """
+    Query the primary search provider and, if it has not answered within its
+    latency percentile (or it fails), fire the next provider. Once the first
+    response arrives, other in-flight providers get a short grace period and
+    everything that answered is merged and deduplicated.
+    Raises SearchUnavailableError when no provider has quota or every provider failed.
+    """
+    logger = logging.getLogger(f"job_{job_id}")
+    pending = {}
+    results = {}
+    errors = []
+    remaining = list(search_providers)
+
+    def fire_next():
+        while remaining:
+            provider = remaining.pop(0)
+            if not provider.try_acquire():
+                logger.warning(f"Search provider {provider.name} has exhausted its daily quota")
+                errors.append(f"{provider.name}: daily quota exhausted")
+                continue
+            logger.info(f"Sending search request to {provider.name}")
+            pending[search_executor.submit(provider.search, search_term)] = provider
+            return time.monotonic() + provider.hedge_delay() if remaining else None
+        return None
+
+    def collect(future):
+        provider = pending.pop(future)
+        try:
+            results[provider.name] = future.result()
+        except Exception as e:
+            logger.warning(f"Search provider {provider.name} failed: {str(e)}")
+            errors.append(f"{provider.name}: {str(e)}")
+
+    hedge_at = fire_next()
+    if not pending:
+        raise SearchUnavailableError("All search providers have exhausted their daily quota")
+
+    # Tavily has no HTTP timeout we can set, so bound how long we wait here instead
+    deadline = time.monotonic() + SEARCH_REQUEST_TIMEOUT
+    merge_deadline = None
+    while pending:
+        if job_stop_events[job_id].is_set():
+            logger.info(f"Job {job_id} stop event detected during hedged_search")
+            return []
+        now = time.monotonic()
+        if merge_deadline is not None and now >= merge_deadline:
+            break
+        if now >= deadline:
+            names = ", ".join(provider.name for provider in pending.values())
+            logger.warning(f"Search providers did not answer within {SEARCH_REQUEST_TIMEOUT}s: {names}")
+            errors.append(f"{names}: timed out")
+            break
+        wake_at = min(t for t in (now + SEARCH_STOP_POLL_INTERVAL, hedge_at, deadline, merge_deadline) if t is not None)
+        done, _ = wait(pending, timeout=max(0, wake_at - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            collect(future)
+        if results:
+            if merge_deadline is None:
+                merge_deadline = time.monotonic() + SEARCH_MERGE_GRACE
+            continue
+        if not pending:
+            hedge_at = fire_next()
+        elif hedge_at is not None and time.monotonic() >= hedge_at:
+            logger.info("No search response within hedge delay, hedging")
+            hedge_at = fire_next()
+
+    if not results:
+        raise SearchUnavailableError(f"All search providers failed ({'; '.join(errors)})")
+    logger.info(f"Search answered by: {', '.join(results)}")
+    return merge_search_results([results[p.name] for p in search_providers if p.name in results])
+
 def search_web(search_term, job_id):
     """Search the Web and obtain a list of web results."""
     logger = logging.getLogger(f"job_{job_id}")
-    google_search_result = google_search.list(q=search_term, cx=GOOGLE_CSE_ID).execute()
-    urls = []
+    urls = hedged_search(search_term, job_id)
     search_chunk = {}
-    for result in google_search_result["items"]:
-        urls.append(result["link"])
     for url in urls:
         if job_stop_events[job_id].is_set():
             logger.info(f"Job {job_id} stop event detected during search_web")
@@ -382,12 +579,9 @@ def update_markdown_table(markdown_table: str, sub_question: str, answer: str) -
 
 import uuid
 import os
-import threading
-import logging
-import time
 from logging.handlers import RotatingFileHandler
 from filelock import FileLock
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from concurrent.futures import TimeoutError
 
 # Global dictionary to store job status and stop events
 job_status = {}
@@ -485,6 +679,9 @@ def process_research(user_input: str, job_id: str):
                 if not check_job_status():
                     break
 
+    except SearchUnavailableError as e:
+        logger.error(f"Web search unavailable, stopping job {job_id}: {str(e)}")
+        update_job_status(job_id, "search_unavailable")
     except Exception as e:
         logger.error(f"An error occurred during research: {str(e)}", exc_info=True)
         update_job_status(job_id, "error")